@@ -1,2 +1,2 @@
-__all__ = ["cli", "organizer", "rules", "utils"]
+__all__ = ["cache", "cli", "organizer", "rules", "utils"]
 __version__ = "1.0.0"
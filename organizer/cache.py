@@ -0,0 +1,83 @@
+from __future__ import annotations
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Dict, Optional, Set, Tuple
+
+# Bumped when stored rows can't be trusted anymore; older tables are dropped on open.
+# v1: rows before it could name the requested algo instead of the one that ran.
+_SCHEMA_VERSION = 1
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS hashes (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL,
+    algo TEXT NOT NULL,
+    digest TEXT NOT NULL
+)
+"""
+
+class HashCache:
+    """
+    Persistent content-hash cache keyed by path and validated against (size, mtime, algo).
+    Lookups may come from several hashing threads; writes are buffered and committed
+    in one transaction by flush().
+    """
+
+    def __init__(self, db_path: Path):
+        db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(db_path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        if self._conn.execute("PRAGMA user_version").fetchone()[0] < _SCHEMA_VERSION:
+            self._conn.execute("DROP TABLE IF EXISTS hashes")
+            self._conn.execute(f"PRAGMA user_version={_SCHEMA_VERSION}")
+        self._conn.execute(_SCHEMA)
+        self._conn.commit()
+        self._lock = threading.Lock()
+        self._pending: Dict[str, Tuple[str, int, float, str, str]] = {}  # path -> row
+        self._stale: Set[str] = set()
+
+    def get(self, path: str, size: int, mtime: float, algo: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT size, mtime, algo, digest FROM hashes WHERE path = ?", (path,)
+            ).fetchone()
+        if row is None or row[0] != size or row[1] != mtime or row[2] != algo:
+            return None
+        return row[3]
+
+    def put(self, path: str, size: int, mtime: float, algo: str, digest: str) -> None:
+        with self._lock:
+            self._stale.discard(path)
+            self._pending[path] = (path, size, mtime, algo, digest)
+
+    def discard(self, path: str) -> None:
+        """Forget a path, e.g. after its file was moved away."""
+        with self._lock:
+            self._pending.pop(path, None)
+            self._stale.add(path)
+
+    def flush(self) -> None:
+        with self._lock:
+            if not self._pending and not self._stale:
+                return
+            with self._conn:
+                self._conn.executemany("DELETE FROM hashes WHERE path = ?", [(p,) for p in self._stale])
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO hashes (path, size, mtime, algo, digest) VALUES (?, ?, ?, ?, ?)",
+                    self._pending.values(),
+                )
+            self._pending.clear()
+            self._stale.clear()
+
+    def close(self) -> None:
+        self.flush()
+        self._conn.close()
+
+    def __enter__(self) -> "HashCache":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
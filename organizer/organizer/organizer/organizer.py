@@ -1,41 +1,127 @@
 from __future__ import annotations
+import contextlib
 import json
 import os
+import queue
+import threading
+from collections import Counter
+from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import Path
-from typing import Dict, Iterable, List, Optional, Tuple
+from typing import ContextManager, Dict, Iterable, Iterator, List, Optional, Set, TextIO, Tuple, Union
 
+from .cache import HashCache
 from .rules import Rules
 from .utils import (
+    QUICK_FP_BYTES,
     MoveResult,
+    cached_hash,
+    effective_hash_algo,
     ensure_dir,
-    file_mtime,
     format_size,
     hash_file,
     is_hidden,
+    list_dir_names,
+    name_key,
     next_nonconflicting_name,
+    quick_fingerprint,
     safe_link_or_copy,
+    same_filesystem,
     within_dir,
 )
 
 Manifest = Dict[str, List[MoveResult]]  # key 'operations' -> list
 
-def _walk_files(root: Path, exclude_dirs: List[str], exclude_hidden: bool) -> Iterable[Path]:
-    for dirpath, dirnames, filenames in os.walk(root):
-        pdir = Path(dirpath)
-        # edit dirnames in-place to prune walk
-        dirnames[:] = [
-            d for d in dirnames
-            if d not in exclude_dirs and not (exclude_hidden and d.startswith("."))
-        ]
-        for name in filenames:
-            p = pdir / name
+WALK_QUEUE_SIZE = 1024  # max walked files buffered ahead of the consumer
+
+def _walk_files(root: Path, exclude_dirs: List[str], exclude_hidden: bool) -> Iterable[os.DirEntry]:
+    # scandir instead of os.walk: DirEntry caches its type and stat, so callers don't re-stat each file
+    try:
+        it = os.scandir(root)
+    except OSError:
+        return
+    subdirs: List[str] = []
+    with it:
+        for entry in it:
+            name = entry.name
+            try:
+                is_dir = entry.is_dir()
+            except OSError:
+                is_dir = False
+            if is_dir:
+                # prune walk; like os.walk, don't descend into symlinked dirs
+                if name in exclude_dirs or (exclude_hidden and name.startswith(".")):
+                    continue
+                if not entry.is_symlink():
+                    subdirs.append(entry.path)
+                continue
             if exclude_hidden and name.startswith("."):
                 continue
-            yield p
+            yield entry
+    for d in subdirs:
+        yield from _walk_files(d, exclude_dirs, exclude_hidden)
+
+def _walk_files_threaded(
+    root: Path, exclude_dirs: List[str], exclude_hidden: bool, maxsize: int = WALK_QUEUE_SIZE
+) -> Iterator[Tuple[os.DirEntry, int]]:
+    """
+    Run _walk_files (plus each file's stat) on a producer thread, yielding (entry, size)
+    through a bounded queue so the caller's work overlaps directory reads.
+    """
+    q: "queue.Queue[object]" = queue.Queue(maxsize=maxsize)
+    stop = threading.Event()
+    errors: List[BaseException] = []
+    done = object()
+
+    def put(item: object) -> bool:
+        # give up once the consumer has stopped, rather than block on a full queue
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def produce() -> None:
+        try:
+            for entry in _walk_files(root, exclude_dirs, exclude_hidden):
+                if not put((entry, entry.stat().st_size)):
+                    return
+        except BaseException as e:  # re-raised by the consumer
+            errors.append(e)
+        put(done)
+
+    walker = threading.Thread(target=produce, name="organizer-walk", daemon=True)
+    walker.start()
+    try:
+        while True:
+            item = q.get()
+            if item is done:
+                break
+            yield item  # type: ignore[misc]
+    finally:
+        stop.set()
+        walker.join()
+    if errors:
+        raise errors[0]
+
+def _stored_sizes(store: Path) -> Set[int]:
+    """Sizes of the objects in a hardlink-mode store (<store>/<ab>/<digest><ext>) left by earlier runs."""
+    sizes: Set[int] = set()
+    try:
+        shards = [e.path for e in os.scandir(store) if len(e.name) == 2 and e.is_dir()]
+    except OSError:
+        return sizes
+    for shard in shards:
+        with os.scandir(shard) as it:
+            sizes.update(e.stat().st_size for e in it if e.is_file())
+    return sizes
 
-def compute_destination(path: Path, dest_root: Path, rules: Rules) -> Path:
+def compute_destination(entry: os.DirEntry, dest_root: Union[str, Path], rules: Rules) -> str:
+    # Plain strings throughout: this runs once per file, and Path objects are comparatively costly
+    st = entry.stat()  # cached on the DirEntry; one stat for mtime and size
     # First pass: extension/glob/mime
-    folder = rules.match_folder_for(path)
+    folder = rules.match_folder_for(entry.path)
     if not folder:
         folder = rules.unknown_folder
 
@@ -43,15 +129,14 @@ def compute_destination(path: Path, dest_root: Path, rules: Rules) -> Path:
 
     # Date rule (enabled)
     if rules.by_date.enabled:
-        parts = [rules.by_date.base_folder] + rules.date_parts(file_mtime(path)) + parts
+        parts = [rules.by_date.base_folder] + rules.date_parts(st.st_mtime) + parts
 
     # Size bucket (optional; appended at the end)
-    size_bucket = rules.match_size_bucket(path.stat().st_size)
+    size_bucket = rules.match_size_bucket(st.st_size)
     if size_bucket:
         parts = [size_bucket] + parts
 
-    target_dir = dest_root.joinpath(*parts)
-    return target_dir / path.name
+    return os.path.join(dest_root, *parts, entry.name)
 
 def organize(
     src_root: Path,
@@ -61,9 +146,11 @@ def organize(
     dry_run: bool = False,
     undo_manifest: Optional[Path] = None,
     log_fn=print,
+    hash_cache: Optional[Path] = None,
 ) -> List[MoveResult]:
     """
     Returns list of MoveResult performed (or planned if dry_run).
+    hash_cache: optional SQLite file persisting content hashes across runs.
     """
     if not src_root.exists():
         raise FileNotFoundError(f"Source folder not found: {src_root}")
@@ -72,53 +159,171 @@ def organize(
     if src_root.resolve() == dest_root.resolve():
         raise RuntimeError("Destination must differ from source.")
 
+    same_fs = same_filesystem(src_root, dest_root)  # moves can then be a plain os.replace
     results: List[MoveResult] = []
-    seen_hashes: Dict[str, Path] = {}
+    # size -> digest -> latest file with that content. Only files whose size (and fingerprint)
+    # collided were ever hashed, so everything else never enters the index.
+    size_index: Dict[int, Dict[str, str]] = {}
+    created_dirs: Set[Path] = set()  # destination dirs known to exist; skips repeat mkdir calls
+    dir_used_names: Dict[Path, Set[str]] = {}  # destination dir -> names taken (on disk or planned)
 
-    # Build duplicate map only within this run (fast); for persistent DB, persist seen_hashes.
-    for f in _walk_files(src_root, rules.exclude_dirs, rules.exclude_hidden):
-        if f.is_dir():
-            continue
-        # compute destination
-        dst = compute_destination(f, dest_root, rules)
-
-        # duplicates?
-        file_hash = hash_file(f)
-        if file_hash in seen_hashes:
-            # This file content already seen in this session
-            if rules.duplicates.action == "skip":
-                log_fn(f"⏭️  Duplicate (skip): {f} (same as {seen_hashes[file_hash]})")
-                results.append(MoveResult(str(f), "", "skip-duplicate"))
-                continue
-            elif rules.duplicates.action == "separate":
-                dst = dest_root / rules.duplicates.folder / f.name
-            elif rules.duplicates.action == "hardlink":
-                # We'll link to the first copy's final destination
-                first_target = dest_root / rules.duplicates.folder / seen_hashes[file_hash].name
-                # If we haven't written the first yet, ensure its folder exists later as well.
-                dst = first_target
+    def names_in(directory: Path) -> Set[str]:
+        names = dir_used_names.get(directory)
+        if names is None:
+            names = dir_used_names[directory] = list_dir_names(directory)
+        return names
 
-        seen_hashes[file_hash] = f
+    # Files this run keeps open and writes itself, and so must never pick up from the source tree
+    # (e.g. the CLI's default manifest in the current directory, when hidden files are included).
+    own_files: Set[str] = set()
+    if undo_manifest:
+        own_files.add(name_key(os.path.realpath(undo_manifest)))
+    if hash_cache:
+        # SQLite keeps WAL mode's -wal and -shm files next to the database
+        db = os.path.realpath(hash_cache)
+        own_files.update(name_key(db + suffix) for suffix in ("", "-wal", "-shm", "-journal"))
+    own_names = {os.path.basename(p) for p in own_files}
 
-        # ensure destination dir
-        final_dst = next_nonconflicting_name(dst)
+    # The walk runs on a producer thread. As soon as a size is seen twice, those files are
+    # queued on the hash pool (the hash C code releases the GIL), so directory reads and
+    # hashing overlap. Files with a unique size can't be duplicates and are never read.
+    # Digests aren't written during dry runs: a plan must not touch the disk.
+    cache = HashCache(hash_cache) if hash_cache and not dry_run else None
+    try:
+        algo = rules.duplicates.hash_algo
+        hashed_algo = effective_hash_algo(algo)
+        files: List[Tuple[os.DirEntry, int]] = []
+        size_to_paths: Dict[int, List[str]] = {}
+        fp_futures: Dict[str, Tuple[int, "Future[bytes]"]] = {}
+        hash_futures: Dict[str, "Future[str]"] = {}
+        hashes: Dict[str, str] = {}
+        cached_sizes: Set[int] = set()  # sizes with a digest taken straight from the cache
+        # hardlink mode: a file may duplicate an object stored by an earlier run, which can only
+        # be the case if their sizes match. Those files are hashed even when unique in this run.
+        stored_sizes = (
+            _stored_sizes(dest_root / rules.duplicates.folder) if rules.duplicates.action == "hardlink" else set()
+        )
+        with ThreadPoolExecutor(max_workers=os.cpu_count()) as pool:
+            def submit(f: str, size: int) -> None:
+                # Second level: head+tail fingerprint, for files where that reads less than a full hash,
+                # unless the cache already holds a valid full digest (then nothing is read at all).
+                if size > 2 * QUICK_FP_BYTES:
+                    digest = cached_hash(f, algo, cache) if cache is not None else None
+                    if digest is None:
+                        fp_futures[f] = (size, pool.submit(quick_fingerprint, f, size))
+                        return
+                    hashes[f] = digest
+                    cached_sizes.add(size)
+                else:
+                    hash_futures[f] = pool.submit(hash_file, f, algo, cache)
 
-        if dry_run:
-            action = "plan-move" if mode == "move" else ("plan-copy" if mode == "copy" else "plan-hardlink")
-            log_fn(f"🧭  {action.upper()}: {f} -> {final_dst}")
-            results.append(MoveResult(str(f), str(final_dst), action))
-            continue
+            for entry, size in _walk_files_threaded(src_root, rules.exclude_dirs, rules.exclude_hidden):
+                if name_key(entry.name) in own_names and name_key(os.path.realpath(entry.path)) in own_files:
+                    continue
+                files.append((entry, size))
+                group = size_to_paths.setdefault(size, [])
+                group.append(entry.path)
+                if len(group) == 2 and size not in stored_sizes:
+                    submit(group[0], size)
+                if len(group) >= 2 or size in stored_sizes:
+                    submit(entry.path, size)
+
+            # Third level: full content hash only where size and fingerprint both collide. A file
+            # sharing its size with a cached or stored one has no fingerprint to compare against, so it's hashed.
+            fp_groups: Dict[Tuple[int, bytes], List[str]] = {}
+            for f, (size, fut) in fp_futures.items():
+                fp_groups.setdefault((size, fut.result()), []).append(f)
+            for (size, _), group in fp_groups.items():
+                if len(group) > 1 or size in cached_sizes or size in stored_sizes:
+                    for f in group:
+                        hash_futures[f] = pool.submit(hash_file, f, algo, cache)
+            hashes.update((f, fut.result()) for f, fut in hash_futures.items())
+        digest_counts = Counter(hashes.values()) if rules.duplicates.action == "hardlink" else Counter()
+
+        # Undo manifest: JSON lines, one record written right after each filesystem operation,
+        # so an interrupted run can still be undone. Line-buffered: each record reaches the file
+        # as soon as it is written.
+        if not dry_run and undo_manifest:
+            ensure_dir(undo_manifest.parent)
+            manifest_ctx: ContextManager[Optional[TextIO]] = undo_manifest.open("w", encoding="utf-8", buffering=1)
+        else:
+            manifest_ctx = contextlib.nullcontext()
+        with manifest_ctx as manifest:
+            # Build duplicate map only within this run (fast); the hash cache persists digests across runs.
+            # Files are visited serially in walk order so the first copy seen still wins.
+            for entry, size in files:
+                f = entry.path
+                # compute destination; the only Path built per file
+                dst = Path(compute_destination(entry, dest_root, rules))
+
+                # duplicates?
+                file_hash = hashes.get(f)
+                link_from: Optional[Path] = None  # stored object the file is linked from instead
+                if file_hash is not None and rules.duplicates.action == "hardlink":
+                    # Content-addressed: one object per digest, sharded by its first two hex chars.
+                    # The first copy becomes the object; every later one (in this run or a later run)
+                    # is a link to it at its own destination.
+                    stored = dest_root / rules.duplicates.folder / file_hash[:2] / (
+                        file_hash + os.path.splitext(entry.name)[1].lower()
+                    )
+                    if name_key(stored.name) in names_in(stored.parent):
+                        link_from = stored
+                    elif digest_counts[file_hash] > 1:
+                        dst = stored
+                elif file_hash is not None:
+                    seen_hashes = size_index.setdefault(size, {})
+                    if file_hash in seen_hashes:
+                        # This file content already seen in this session
+                        if rules.duplicates.action == "skip":
+                            log_fn(f"⏭️  Duplicate (skip): {f} (same as {seen_hashes[file_hash]})")
+                            results.append(MoveResult(f, "", "skip-duplicate"))
+                            continue
+                        elif rules.duplicates.action == "separate":
+                            dst = dest_root / rules.duplicates.folder / entry.name
+                    seen_hashes[file_hash] = f
+
+                # pick a free name; each destination dir is listed once, then tracked in memory
+                final_dst = next_nonconflicting_name(dst, names_in(dst.parent))
+
+                if dry_run:
+                    action = "plan-move" if mode == "move" else ("plan-copy" if mode == "copy" else "plan-hardlink")
+                    log_fn(f"🧭  {action.upper()}: {f} -> {final_dst}")
+                    results.append(MoveResult(f, str(final_dst), action))
+                    continue
 
-        ensure_dir(final_dst.parent)
-        action = safe_link_or_copy(f, final_dst, mode if rules.duplicates.action != "hardlink" else "hardlink")
-        results.append(MoveResult(str(f), str(final_dst), action))
-        log_fn(f"✅ {action.upper()}: {f.name} -> {final_dst}")
+                parent = final_dst.parent
+                if parent not in created_dirs:
+                    ensure_dir(parent)
+                    # its ancestors exist now as well
+                    created_dirs.add(parent)
+                    created_dirs.update(parent.parents)
+                if link_from is not None:
+                    action, written = safe_link_or_copy(link_from, final_dst, "hardlink")
+                else:
+                    action, written = safe_link_or_copy(
+                        f, final_dst, mode if rules.duplicates.action != "hardlink" else "hardlink", same_fs=same_fs
+                    )
+                if written != final_dst:
+                    # the disk disagreed with our name set (e.g. a concurrent writer); record the truth
+                    names_in(written.parent).add(name_key(written.name))
+                    final_dst = written
+                result = MoveResult(f, str(final_dst), action)
+                results.append(result)
+                if manifest is not None:
+                    manifest.write(json.dumps(result.__dict__, separators=(",", ":")) + "\n")
+                log_fn(f"✅ {action.upper()}: {entry.name} -> {final_dst}")
+                if cache is not None and file_hash is not None:
+                    # Moves, copies and links keep size and mtime, so the digest stays valid at the
+                    # new location; a later run over the destination then hits the cache.
+                    st = entry.stat()
+                    cache.put(os.path.abspath(final_dst), st.st_size, st.st_mtime, hashed_algo, file_hash)
+                    if action == "move":
+                        cache.discard(os.path.abspath(f))
+    finally:
+        if cache is not None:
+            cache.close()  # commits all new digests in one transaction
 
-    # write undo manifest
     if not dry_run and undo_manifest:
-        ensure_dir(undo_manifest.parent)
-        serializable = {"operations": [r.__dict__ for r in results if r.action in ("move", "copy", "hardlink")]}
-        undo_manifest.write_text(json.dumps(serializable, indent=2), encoding="utf-8")
         log_fn(f"📝 Undo manifest saved -> {undo_manifest}")
     return results
 
@@ -128,8 +333,24 @@ def undo(undo_manifest: Path, log_fn=print) -> List[MoveResult]:
     """
     if not undo_manifest.exists():
         raise FileNotFoundError(f"Undo manifest not found: {undo_manifest}")
-    data = json.loads(undo_manifest.read_text(encoding="utf-8"))
-    ops = data.get("operations", [])
+    text = undo_manifest.read_text(encoding="utf-8")
+    try:
+        data = json.loads(text)
+    except json.JSONDecodeError:
+        data = None
+    if isinstance(data, dict) and "operations" in data:
+        ops = data["operations"]  # manifest from an older version: one JSON document
+    else:
+        lines = [line for line in text.splitlines() if line.strip()]
+        ops = []
+        for i, line in enumerate(lines):
+            try:
+                ops.append(json.loads(line))
+            except json.JSONDecodeError:
+                if i != len(lines) - 1:
+                    raise
+                # Only the last record can be cut short, by a run that was killed mid-write
+                log_fn(f"⚠️  Skipping incomplete last record in {undo_manifest}: {line!r}")
     # reverse in LIFO order to minimize conflicts
     undone: List[MoveResult] = []
     for rec in reversed(ops):
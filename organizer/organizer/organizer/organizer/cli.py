@@ -5,6 +5,7 @@ import sys
 
 from .rules import Rules
 from .organizer import organize, undo
+from .utils import BufferedLog
 
 BANNER = "📂 Smart File Organizer — blazing-fast, safe, and configurable."
 
@@ -18,7 +19,9 @@ def parse_args(argv=None):
     common.add_argument("-c", "--config", type=Path, default=None, help="Config file (JSON or YAML)")
     common.add_argument("--mode", choices=["move", "copy", "hardlink"], default="move", help="How to place files at destination")
     common.add_argument("--manifest", type=Path, default=Path(".undo_manifest.json"), help="Where to save undo manifest")
+    common.add_argument("--hash-cache", type=Path, default=None, help="Persistent hash cache (default: next to the manifest)")
     common.add_argument("--no-hidden", action="store_true", help="Exclude hidden files (overrides config)")
+    common.add_argument("-q", "--quiet", action="store_true", help="Don't log each file")
 
     p_org = sub.add_parser("organize", parents=[common], help="Organize files")
     p_org.add_argument("--dry-run", action="store_true", help="Plan only; don't modify files")
@@ -28,29 +31,38 @@ def parse_args(argv=None):
 
     p_undo = sub.add_parser("undo", help="Undo a previous run using manifest")
     p_undo.add_argument("-m", "--manifest", type=Path, default=Path(".undo_manifest.json"))
+    p_undo.add_argument("-q", "--quiet", action="store_true", help="Don't log each file")
 
     return p.parse_args(argv)
 
 def main(argv=None):
     args = parse_args(argv)
+    # per-file messages are batched into one stdout write per flush
+    log = BufferedLog()
+    log_fn = (lambda m: None) if args.quiet else log
     if args.cmd in ("organize", "plan"):
         rules = Rules.load(args.config)
         if args.no_hidden:
             rules.exclude_hidden = True
         print(BANNER)
         print(f"Source: {args.source}\nDest:   {args.dest}\nMode:   {args.mode}\nDryRun: {getattr(args, 'dry_run', False)}")
-        organize(
-            src_root=args.source,
-            dest_root=args.dest,
-            rules=rules,
-            mode=args.mode,
-            dry_run=getattr(args, "dry_run", False),
-            undo_manifest=args.manifest if not getattr(args, "dry_run", False) else None,
-            log_fn=lambda m: print(m),
-        )
+        with log:
+            organize(
+                src_root=args.source,
+                dest_root=args.dest,
+                rules=rules,
+                mode=args.mode,
+                dry_run=getattr(args, "dry_run", False),
+                undo_manifest=args.manifest if not getattr(args, "dry_run", False) else None,
+                log_fn=log_fn,
+                hash_cache=None if getattr(args, "dry_run", False) else (
+                    args.hash_cache or args.manifest.with_name(".hash_cache.sqlite")
+                ),
+            )
     elif args.cmd == "undo":
         print(BANNER)
-        undo(args.manifest, log_fn=lambda m: print(m))
+        with log:
+            undo(args.manifest, log_fn=log_fn)
     else:
         raise SystemExit("Unknown command")
 
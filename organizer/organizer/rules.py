@@ -1,9 +1,37 @@
 from __future__ import annotations
+import fnmatch
+import functools
 import json
 import mimetypes
+import os
+import re
+import time
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Dict, List, Optional, Any
+from typing import Dict, List, Optional, Any, Pattern, Tuple, Union
+
+_DATE_FORMATS = {"year": "%Y", "month": "%Y/%m", "day": "%Y/%m/%d"}
+_GLOB_FLAGS = re.IGNORECASE if os.name == "nt" else 0  # Path.match is case-insensitive on Windows
+
+def _suffix(name: str) -> str:
+    """Same as PurePath(name).suffix."""
+    i = name.rfind(".")
+    return name[i:] if 0 < i < len(name) - 1 else ""
+
+def _anchor(path: str) -> str:
+    """Root of a '/'-separated path as PurePosixPath sees it: '', '/' or (exactly two slashes) '//'."""
+    if not path.startswith("/"):
+        return ""
+    return "//" if path.startswith("//") and not path.startswith("///") else "/"
+
+@functools.lru_cache(maxsize=None)
+def _compile_glob(pattern: str) -> Tuple[Tuple[Pattern[str], ...], str]:
+    """Compile a glob into one regex per path component, plus the root it is anchored at (if any)."""
+    components = [c for c in pattern.split("/") if c not in ("", ".")]
+    anchor = _anchor(pattern)
+    if not components and not anchor:
+        raise ValueError(f"empty pattern: {pattern!r}")  # as Path.match; it would match every file
+    return tuple(re.compile(fnmatch.translate(c), _GLOB_FLAGS) for c in components), anchor
 
 @dataclass
 class DateRule:
@@ -15,6 +43,7 @@ class DateRule:
 class DuplicateRule:
     action: str = "separate"  # 'separate' | 'skip' | 'hardlink'
     folder: str = "Duplicates"
+    hash_algo: str = "xxh3"  # 'xxh3' | 'blake3' | 'sha256'
 
 @dataclass
 class Rules:
@@ -29,6 +58,12 @@ class Rules:
     size_buckets: List[dict]
     duplicates: DuplicateRule
 
+    def __post_init__(self) -> None:
+        # match_folder_for runs once per file: memoize MIME lookups per suffix. This only depends
+        # on the mimetypes registry, so later edits to the rules themselves still take effect
+        # (globs are compiled through the module-level _compile_glob cache for the same reason).
+        self._mime_ext_cache: Dict[str, Optional[str]] = {}
+
     @staticmethod
     def load(path: Optional[Path]) -> "Rules":
         cfg: dict
@@ -68,20 +103,49 @@ class Rules:
         }
         return rules
 
-    def match_folder_for(self, path: Path) -> Optional[str]:
+    def match_folder_for(self, path: Union[str, Path]) -> Optional[str]:
         """Return a subfolder name for the file based on configured rules (excluding date/size)."""
+        # Works on the plain string: this runs once per file, and needs no Path objects
+        path = os.fspath(path)
+        name = os.path.basename(path)
+        suffix = _suffix(name)
         # Extension rule
-        ext = path.suffix.lower()
+        ext = suffix.lower()
         if ext in self.by_extension:
             return self.by_extension[ext]
 
-        # Glob rule
+        # Glob rule (same semantics as Path.match: components are matched from the right)
+        parts: Optional[List[str]] = None
+        posix = ""
         for pattern, folder in self.by_glob.items():
-            if path.match(pattern):
+            regexes, anchor = _compile_glob(pattern)
+            if len(regexes) == 1 and not anchor:
+                if regexes[0].match(name):
+                    return folder
+                continue
+            if parts is None:
+                posix = path if os.sep == "/" else path.replace(os.sep, "/")
+                raw = posix.split("/")
+                # Like Path.parts: no '.' or empty components; a leading '' marks an absolute path
+                parts = [p for p in raw[1:] if p not in ("", ".")]
+                if raw[0] != ".":
+                    parts.insert(0, raw[0])
+            if anchor:
+                if _anchor(posix) != anchor or len(parts) - 1 != len(regexes):
+                    continue
+            elif len(parts) < len(regexes):
+                continue
+            if all(r.match(p) for r, p in zip(regexes, parts[-len(regexes):])):
                 return folder
 
-        # MIME rule
-        mime, _ = mimetypes.guess_type(path.as_posix())
+        # MIME rule (guess_type only looks at the suffix, plus the one before an encoding like .gz)
+        key = suffix
+        if key in mimetypes.encodings_map:
+            key = _suffix(name[: -len(key)]) + key
+        try:
+            mime = self._mime_ext_cache[key]
+        except KeyError:
+            mime = self._mime_ext_cache[key] = mimetypes.guess_type("x" + key)[0]
         if mime:
             for prefix, folder in self.by_mime.items():
                 if mime.startswith(prefix):
@@ -106,10 +170,5 @@ class Rules:
         return None
 
     def date_parts(self, ts: float):
-        import datetime as _dt
-        dt = _dt.datetime.fromtimestamp(ts)
-        if self.by_date.group == "year":
-            return [f"{dt.year:04d}"]
-        elif self.by_date.group == "day":
-            return [f"{dt.year:04d}", f"{dt.month:02d}", f"{dt.day:02d}"]
-        return [f"{dt.year:04d}", f"{dt.month:02d}"]  # default month
+        fmt = _DATE_FORMATS.get(self.by_date.group, "%Y/%m")  # default month
+        return time.strftime(fmt, time.localtime(ts)).split("/")
@@ -1,13 +1,33 @@
 from __future__ import annotations
+import errno
 import hashlib
+import mmap
 import os
 import shutil
 import stat
+import sys
+import threading
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Optional, Tuple
+from typing import TYPE_CHECKING, List, Optional, Set, TextIO, Tuple, Union
+
+if TYPE_CHECKING:
+    from .cache import HashCache
+
+try:
+    import blake3  # type: ignore
+except ImportError:  # optional: pip install blake3
+    blake3 = None
+
+try:
+    import xxhash  # type: ignore
+except ImportError:  # optional: pip install xxhash
+    xxhash = None
 
 HASH_CHUNK = 2 * 1024 * 1024  # 2MB
+MMAP_MIN = 1024 * 1024  # 1MB; files this big are hashed from an mmap instead of chunked reads
+XXH3_SEED = 0
+QUICK_FP_BYTES = 64 * 1024  # 64KB read from each end of a file by quick_fingerprint
 
 def normalize_ext(path: Path) -> str:
     ext = path.suffix.lower()
@@ -23,63 +43,234 @@ def is_hidden(path: Path) -> bool:
     except Exception:
         return False
 
+SIZE_UNITS = ("B", "KB", "MB", "GB", "TB")
+
 def format_size(n: int) -> str:
-    for unit in ["B","KB","MB","GB","TB"]:
-        if n < 1024 or unit == "TB":
-            return f"{n:.1f}{unit}" if unit != "B" else f"{n}B"
-        n /= 1024.0
-    return f"{n:.1f}TB"
-
-def hash_file(path: Path) -> str:
-    h = hashlib.sha256()
-    with path.open("rb") as f:
+    if n < 1024:
+        return f"{n}B"
+    # n >= 1024**k exactly when it needs more than 10*k bits
+    unit_idx = min((n.bit_length() - 1) // 10, len(SIZE_UNITS) - 1)
+    return f"{n / (1 << (10 * unit_idx)):.1f}{SIZE_UNITS[unit_idx]}"
+
+def effective_hash_algo(algo: str) -> str:
+    """The algorithm hash_file really uses for algo: sha256 when the xxh3/blake3 package is missing."""
+    if (algo == "xxh3" and xxhash is not None) or (algo == "blake3" and blake3 is not None):
+        return algo
+    return "sha256"
+
+def cached_hash(path: Union[str, Path], algo: str, cache: "HashCache") -> Optional[str]:
+    """The digest hash_file would return from the cache, or None if it would have to read the file."""
+    st = os.stat(path)
+    return cache.get(os.path.abspath(path), st.st_size, st.st_mtime, effective_hash_algo(algo))
+
+def hash_file(path: Union[str, Path], algo: str = "xxh3", cache: Optional["HashCache"] = None) -> str:
+    """
+    algo: 'xxh3' | 'blake3' | 'sha256'
+    xxh3 (128-bit) and blake3 fall back to sha256 if their package is missing.
+    With a cache, a digest recorded for the same path, size, mtime and algorithm is reused.
+    """
+    algo = effective_hash_algo(algo)  # cache rows must name the algorithm that actually ran
+    st = os.stat(path)
+    if cache is None:
+        return _hash_contents(path, st.st_size, algo)
+    key = os.path.abspath(path)
+    digest = cache.get(key, st.st_size, st.st_mtime, algo)
+    if digest is None:
+        digest = _hash_contents(path, st.st_size, algo)
+        cache.put(key, st.st_size, st.st_mtime, algo, digest)
+    return digest
+
+def _hash_contents(path: Union[str, Path], size: int, algo: str) -> str:
+    # algo has been through effective_hash_algo. Files of MMAP_MIN bytes or more are hashed from a read-only memory map.
+    if algo == "xxh3":
+        h = xxhash.xxh3_128(seed=XXH3_SEED)
+    elif algo == "blake3":
+        if size >= MMAP_MIN:
+            # blake3 maps the file itself and hashes it multi-threaded
+            h = blake3.blake3(max_threads=blake3.blake3.AUTO)
+            h.update_mmap(path)
+            return h.hexdigest()
+        h = blake3.blake3()
+    else:
+        h = hashlib.sha256()
+    if size < MMAP_MIN:
+        # Small file: a single read and a single allocation
+        with open(path, "rb") as f:
+            h.update(f.read())
+        return h.hexdigest()
+    try:
+        fd = os.open(path, os.O_RDONLY | getattr(os, "O_BINARY", 0))
+        try:
+            mm = mmap.mmap(fd, 0, access=mmap.ACCESS_READ)
+        finally:
+            os.close(fd)
+    except (OSError, ValueError):
+        mm = None  # not mappable (some network/virtual filesystems); stream it instead
+    if mm is not None:
+        with mm:
+            h.update(mm)
+        return h.hexdigest()
+    # Stream through one reused buffer rather than a new bytes object per chunk
+    buf = bytearray(HASH_CHUNK)
+    view = memoryview(buf)
+    with open(path, "rb", buffering=0) as f:
         while True:
-            chunk = f.read(HASH_CHUNK)
-            if not chunk:
+            n = f.readinto(buf)
+            if not n:
                 break
-            h.update(chunk)
+            h.update(view[:n])
     return h.hexdigest()
 
+def quick_fingerprint(path: Union[str, Path], size: int) -> bytes:
+    """
+    Digest of the first and last QUICK_FP_BYTES of a file: a cheap pre-check so that
+    hash_file only runs on files whose size and head+tail both collide.
+    """
+    h = xxhash.xxh3_128(seed=XXH3_SEED) if xxhash is not None else hashlib.blake2b(digest_size=16)
+    fd = os.open(path, os.O_RDONLY | getattr(os, "O_BINARY", 0))
+    try:
+        h.update(os.read(fd, QUICK_FP_BYTES))
+        if size > QUICK_FP_BYTES:
+            os.lseek(fd, max(QUICK_FP_BYTES, size - QUICK_FP_BYTES), os.SEEK_SET)
+            h.update(os.read(fd, QUICK_FP_BYTES))
+    finally:
+        os.close(fd)
+    return h.digest()
+
 @dataclass
 class MoveResult:
     src: str
     dst: str
     action: str  # "move" | "copy" | "skip-duplicate" | "hardlink"
 
+class BufferedLog:
+    """
+    log_fn that batches messages and writes each batch with a single call: flushed every
+    max_messages messages, or interval seconds after the first unflushed one.
+    """
+
+    def __init__(self, stream: Optional[TextIO] = None, max_messages: int = 1000, interval: float = 0.05):
+        self._stream = stream if stream is not None else sys.stdout
+        self._max_messages = max_messages
+        self._interval = interval
+        self._buf: List[str] = []
+        self._lock = threading.Lock()
+        self._timer: Optional[threading.Timer] = None
+
+    def __call__(self, msg: str) -> None:
+        with self._lock:
+            self._buf.append(msg)
+            if len(self._buf) >= self._max_messages:
+                self._flush_locked()
+            elif self._timer is None:
+                self._timer = threading.Timer(self._interval, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def flush(self) -> None:
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_locked(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._buf:
+            self._stream.write("\n".join(self._buf) + "\n")
+            self._stream.flush()
+            self._buf.clear()
+
+    def close(self) -> None:
+        self.flush()
+
+    def __enter__(self) -> "BufferedLog":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
 def ensure_dir(path: Path) -> None:
     path.mkdir(parents=True, exist_ok=True)
 
-def next_nonconflicting_name(dst: Path) -> Path:
-    if not dst.exists():
+# Default filesystems on Windows and macOS ignore case: "Note.txt" and "note.txt" collide there.
+CASE_INSENSITIVE_FS = sys.platform in ("win32", "cygwin", "darwin")
+
+def name_key(name: str) -> str:
+    """How a file name is compared in used-name sets (case-folded on case-insensitive platforms)."""
+    return name.casefold() if CASE_INSENSITIVE_FS else name
+
+def next_nonconflicting_name(dst: Path, used_names: Optional[Set[str]] = None) -> Path:
+    """
+    used_names: name_key()s already taken in dst.parent. When given, the search is done in
+    memory instead of stat-ing each candidate, and the chosen name is added to the set.
+    """
+    if used_names is None:
+        if not dst.exists():
+            return dst
+    elif name_key(dst.name) not in used_names:
+        used_names.add(name_key(dst.name))
         return dst
     stem, suffix = dst.stem, dst.suffix
     parent = dst.parent
     i = 1
     while True:
         candidate = parent / f"{stem}({i}){suffix}"
-        if not candidate.exists():
+        if used_names is None:
+            if not candidate.exists():
+                return candidate
+        elif name_key(candidate.name) not in used_names:
+            used_names.add(name_key(candidate.name))
             return candidate
         i += 1
 
-def safe_link_or_copy(src: Path, dst: Path, mode: str) -> str:
+def list_dir_names(path: Path) -> Set[str]:
+    """name_key()s of the entries currently in a directory (empty if it doesn't exist yet)."""
+    try:
+        with os.scandir(path) as it:
+            return {name_key(e.name) for e in it}
+    except FileNotFoundError:
+        return set()
+
+def safe_link_or_copy(src: Union[str, Path], dst: Path, mode: str, same_fs: bool = False) -> Tuple[str, Path]:
     """
     mode: 'move' | 'copy' | 'hardlink'
+    same_fs: src and dst are (probably) on one filesystem, so a move is a single rename
+    Returns (action, path actually written): dst is re-checked on disk right before writing,
+    so it can differ from the requested one if something else took that name meanwhile.
     """
     dst = next_nonconflicting_name(dst)
     if mode == "hardlink":
         try:
             os.link(src, dst)
-            return "hardlink"
+            return "hardlink", dst
         except OSError:
             # Fall back to copy if hardlink not supported
             shutil.copy2(src, dst)
-            return "copy"
+            return "copy", dst
     elif mode == "copy":
         shutil.copy2(src, dst)
-        return "copy"
+        return "copy", dst
     else:
+        if same_fs:
+            try:
+                os.replace(src, dst)
+                return "move", dst
+            except OSError as e:
+                if e.errno != errno.EXDEV:
+                    raise
+                # e.g. a mount point inside the source tree; let shutil copy across
         shutil.move(str(src), str(dst))
-        return "move"
+        return "move", dst
+
+def same_filesystem(a: Path, b: Path) -> bool:
+    """Whether a and b live on the same device; b may not exist yet (its nearest existing ancestor is used)."""
+    b = b.absolute()
+    while not b.exists() and b != b.parent:
+        b = b.parent
+    try:
+        return os.stat(a).st_dev == os.stat(b).st_dev
+    except OSError:
+        return False
 
 def file_mtime(path: Path) -> float:
     return path.stat().st_mtime